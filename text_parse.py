@@ -3,21 +3,32 @@ import os
 import re
 import json
 import time
+import random
 import requests
 import logging
 import openpyxl
+import ahocorasick
 import hashlib
+import zipfile
 import asyncio
+import threading
+import collections
+import functools
 from dotenv import load_dotenv
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 from datetime import datetime, timedelta
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QMessageBox
 )
 from PyQt5.QtCore import pyqtSignal, QDate
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
+from openpyxl.styles import Font, PatternFill, Alignment, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.xml import LXML as OPENPYXL_LXML
 from PyQt5 import uic
 from telethon import TelegramClient
 from telethon.errors import (
@@ -32,38 +43,286 @@ from telethon.tl.types import (
 )
 import argparse
 
+try:
+    # Ответы wall.get большие, orjson разбирает их в разы быстрее стандартного json
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+try:
+    # Читалка Excel на Rust: список сообществ читается в разы быстрее, чем через openpyxl
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[logging.StreamHandler()]
             )
 
+if not OPENPYXL_LXML:
+    # Без lxml openpyxl пишет XML через стандартный xml.etree, сохранение отчета заметно медленнее
+    logging.warning("lxml не установлен: отчеты Excel будут сохраняться медленнее (pip install lxml)")
+
 load_dotenv()
 
 HASH_TOKEN = os.getenv("TELEGRAM_API_HASH")
 TG_API = os.getenv("TELEGRAM_API_ID")
 VK_TOKEN = os.getenv("VK_TOKEN")
 VK_VERSION = '5.137'
+VK_API_URL = 'https://api.vk.com/method/'
 MAX_POSTS = 100
 MAX_WORKERS = 5
 REQUEST_DELAY = 0.34
+VK_RATE_LIMIT = 3  # запросов в секунду на один токен
 MAX_ATTEMPTS = 3
 BACKOFF_FACTOR = 2
+EXECUTE_BATCH = 25  # VK execute выполняет не более 25 вложенных вызовов API
+RETRY_STATUSES = (429, 500, 502, 503, 504)  # HTTP-статусы, которые повторяет сам адаптер
 
 # Стили для Excel
 HEADER_FILL = PatternFill(start_color='4682B4', end_color='4682B4', fill_type='solid')
 HEADER_FONT = Font(bold=True, color="FFFFFF", size=11)
 HEADER_ALIGN = Alignment(horizontal='center', vertical='center', wrap_text=True)
 LINK_FONT = Font(color="0000FF", underline="single")
+WRAP_ALIGN = Alignment(wrap_text=True)
+# Именованные стили отчета: ячейка ссылается на стиль по имени, без копирования шрифта и выравнивания
+HEADER_STYLE = 'report_header'
+LINK_STYLE = 'report_link'
+WRAP_STYLE = 'report_wrap'
+
+# Сообщество из загруженного списка: кортеж компактнее словаря с теми же полями
+# platform и bare - префикс платформы и имя без префикса, считаются один раз при загрузке
+Community = collections.namedtuple('Community', ['original_link', 'domain', 'name', 'platform', 'bare'])
+# Найденный пост или комментарий: только поля, которые попадают в отчет
+ResultRow = collections.namedtuple(
+    'ResultRow', ['type', 'link', 'text', 'found_words', 'date', 'views', 'likes', 'reposts']
+)
+# Сообщество без совпадений для листа "Не найдено"
+EmptyComm = collections.namedtuple('EmptyComm', ['original_link', 'name', 'reason'])
+
+# Шаблоны ссылок на сообщества, компилируются один раз при импорте
+# Шаблоны платформы собраны в одно выражение: альтернативы проверяются по порядку,
+# поэтому срабатывает первый подходящий шаблон, как при переборе списка
+VK_PATTERN = re.compile(r'(?s)^(?:' + '|'.join(r'.*?' + pattern for pattern in (
+    r'(?:https?://)?(?:www\.)?vk\.ru/([a-z0-9_\-\.]+)/?',
+    r'club(\d+)',
+    r'public(\d+)',
+    r'id(\d+)',
+    r'([a-z0-9_\-\.]+)$'
+)) + ')')
+
+TG_PATTERN = re.compile(r'(?s)^(?:' + '|'.join(r'.*?' + pattern for pattern in (
+    r'(?:https?://)?(?:www\.)?t(?:elegram)?\.me/([a-z0-9_\-]+)/?',
+    r'(?:https?://)?(?:www\.)?telegram\.org/([a-z0-9_\-]+)/?',
+    r'@([a-z0-9_\-]+)$'
+)) + ')')
+
+def match_domain(pattern, link):
+    """Возвращает захваченное имя из сработавшей альтернативы или None"""
+    match = pattern.match(link)
+    if match:
+        return next(group for group in match.groups() if group is not None)
+    return None
+
+# Допустимые символы короткого имени, как в группах шаблонов выше
+VK_DOMAIN_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz0123456789_-.')
+TG_DOMAIN_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz0123456789_-')
+
+def link_tail(link, marker, allowed):
+    """
+    Быстрый разбор ссылки без регулярных выражений
+    Возвращает часть ссылки после marker до первого из символов /?#,
+    если она непустая и состоит только из allowed, иначе None
+    """
+    idx = link.find(marker)
+    if idx < 0:
+        return None
+
+    tail = link[idx + len(marker):]
+    end = len(tail)
+    for sep in '/?#':
+        pos = tail.find(sep, 0, end)
+        if pos >= 0:
+            end = pos
+    tail = tail[:end]
+
+    return tail if tail and allowed.issuperset(tail) else None
+
+@functools.lru_cache(maxsize=100_000)
+def extract_domain(link):
+    """
+    Определяет платформу и короткое имя сообщества по ссылке (уже в нижнем регистре)
+    Результат кэшируется: повторная загрузка того же списка не разбирает ссылки заново
+    """
+    # Обрабатываем vk.ru и vk.com как эквивалентные
+    link = link.replace('vk.com', 'vk.ru')
+    
+    # Быстрый путь для обычных ссылок t.me/... и vk.com/...
+    # Остальные варианты разбираются регулярными выражениями ниже
+    if 'telegram.' not in link and '@' not in link:
+        domain = link_tail(link, 't.me/', TG_DOMAIN_CHARS)
+        if domain:
+            return f"tg_{domain}"
+        if 't.me/' not in link:
+            domain = link_tail(link, 'vk.ru/', VK_DOMAIN_CHARS)
+            if domain:
+                return f"vk_{domain}"
+    
+    # Проверяем Telegram
+    domain = match_domain(TG_PATTERN, link)
+    if domain is not None:
+        return f"tg_{domain}"
+
+    domain = match_domain(VK_PATTERN, link)
+    if domain is not None:
+        return f"vk_{domain}"
+            
+    return None
+
+def active_sheet_index(file_path):
+    """Номер активного листа xlsx, как его выбирает openpyxl (wb.active); для xls - 0"""
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            match = re.search(rb'activeTab="(\d+)"', zf.read('xl/workbook.xml'))
+        return int(match.group(1)) if match else 0
+    except (zipfile.BadZipFile, KeyError):
+        return 0
+
+def read_sheet_rows(file_path):
+    """
+    Первые две колонки активного листа без строки заголовка
+    Через python-calamine, если он установлен, иначе через openpyxl в режиме read_only
+    """
+    if CalamineWorkbook is not None:
+        workbook = CalamineWorkbook.from_path(file_path)
+        try:
+            sheet = workbook.get_sheet_by_index(active_sheet_index(file_path))
+            # calamine отдает пустые ячейки как '', а целые числа как float
+            for row in sheet.to_python(skip_empty_area=False)[1:]:
+                yield tuple(
+                    None if value == '' else int(value) if isinstance(value, float) and value.is_integer() else value
+                    for value in row[:2]
+                )
+        finally:
+            workbook.close()
+        return
+
+    # read_only: строки читаются потоково, без построения объектов Cell
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(min_row=2, max_col=2, values_only=True)
+    finally:
+        # В режиме read_only файл остается открытым до явного закрытия
+        wb.close()
+
+@functools.lru_cache(maxsize=None)
+def ui_class(ui_file):
+    """
+    Класс окна из .ui файла: XML разбирается и компилируется один раз за запуск
+    Экземпляр собирается вызовом setupUi(экземпляр), виджеты становятся его атрибутами, как при uic.loadUi
+    """
+    form_class, base_class = uic.loadUiType(ui_file)
+    return type(form_class.__name__, (base_class, form_class), {})
+
+def add_report_styles(wb):
+    """Регистрирует именованные стили отчета, чтобы в файле каждый хранился один раз"""
+    for style in (
+        NamedStyle(name=HEADER_STYLE, font=HEADER_FONT, fill=HEADER_FILL, alignment=HEADER_ALIGN),
+        NamedStyle(name=LINK_STYLE, font=LINK_FONT),
+        # Шрифт по умолчанию задается явно: у NamedStyle без font шрифт пустой
+        NamedStyle(name=WRAP_STYLE, font=DEFAULT_FONT, alignment=WRAP_ALIGN)
+    ):
+        if style.name not in wb.named_styles:
+            wb.add_named_style(style)
+
+
+def styled_cell(ws, value, style):
+    """Ячейка с именованным стилем для ws.append, подходит и для листов в режиме write_only"""
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+def copied_cell(ws, cell, styles):
+    """
+    Ячейка листа read_only для ws.append в лист write_only
+    Без оформления возвращается просто значение, иначе WriteOnlyCell с тем же оформлением
+    styles - кэш style_array -> имя стиля: каждое сочетание оформления регистрируется
+    в новой книге один раз как именованный стиль, ячейкам назначается только имя
+    """
+    # EmptyCell (пропуски в строке) не имеет has_style
+    if not getattr(cell, 'has_style', False):
+        return cell.value
+    new_cell = WriteOnlyCell(ws, value=cell.value)
+    key = tuple(cell.style_array)
+    name = styles.get(key)
+    if name is None:
+        name = styles[key] = f"report_copied_{len(styles)}"
+        ws.parent.add_named_style(NamedStyle(
+            name=name,
+            font=cell.font,
+            fill=cell.fill,
+            border=cell.border,
+            alignment=cell.alignment,
+            number_format=cell.number_format,
+            protection=cell.protection
+        ))
+    new_cell.style = name
+    return new_cell
+
+def date_to_timestamp(day):
+    """Unix-время начала суток day по локальному времени"""
+    return int(datetime.combine(day, datetime.min.time()).timestamp())
+
+def format_timestamp(ts):
+    """
+    Форматирует unix-время как ДД.ММ.ГГГГ ЧЧ:ММ (локальное время)
+    Вызывается для каждого найденного поста, поэтому без разбора формата strftime
+    """
+    lt = time.localtime(ts)
+    return '%02d.%02d.%d %02d:%02d' % (lt.tm_mday, lt.tm_mon, lt.tm_year, lt.tm_hour, lt.tm_min)
+
+def format_datetime(dt):
+    """То же, что format_timestamp, для готового datetime (без перевода часового пояса)"""
+    return '%02d.%02d.%d %02d:%02d' % (dt.day, dt.month, dt.year, dt.hour, dt.minute)
 
 class TelegramParser:
     def __init__(self):
         self.client = None
         self.phone = None
+        # Клиент Telethon привязан к циклу событий, в котором подключился,
+        # поэтому все вызовы Telegram идут через один постоянный цикл в отдельном потоке
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def submit(self, coro):
+        """Ставит корутину в цикл Telegram, возвращает concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """Выполняет корутину в цикле Telegram и ждет результат"""
+        return self.submit(coro).result()
+
+    async def disconnect(self):
+        """Отключает клиент; вызывается внутри цикла Telegram, где клиент подключался"""
+        await self.client.disconnect()
+
+    def close(self):
+        """Отключает клиент и останавливает цикл, вызывается при выходе из приложения"""
+        if self.client:
+            try:
+                # disconnect() нельзя вызывать в потоке интерфейса: там клиент видит чужой цикл событий
+                self.run(self.disconnect())
+            except Exception as e:
+                logging.error(f"Ошибка отключения Telegram: {str(e)}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
         
     async def auth(self, phone, code=None, password=None):
         try:
-            self.client = TelegramClient('session_name', TG_API, HASH_TOKEN)
+            # Повторные попытки (код, пароль 2FA) идут через тот же клиент и соединение
+            if self.client is None:
+                self.client = TelegramClient('session_name', TG_API, HASH_TOKEN)
             await self.client.start(phone=phone, code=code, password=password)
             self.phone = phone
             return True
@@ -76,21 +335,24 @@ class TelegramParser:
             raise Exception("Клиент Telegram не инициализирован")
 
         posts = []
-        start_ts = int(time.mktime(start_date.timetuple()))
-        end_ts = int(time.mktime(end_date.timetuple()))
+        start_ts = date_to_timestamp(start_date)
+        end_ts = date_to_timestamp(end_date)
 
         try:
             # Пробуем получить канал по username или ID
-            entity = await self.client.get_entity(channel_name)
+            # Для iter_messages нужна только ссылка на канал: get_input_entity берет ее из кэша сессии,
+            # а get_entity для username каждый раз запрашивает канал целиком
+            entity = await self.client.get_input_entity(channel_name)
             
             async for message in self.client.iter_messages(entity):
-                if message.date.timestamp() < start_ts:
+                message_ts = message.date.timestamp()
+                if message_ts < start_ts:
                     break
                     
-                if start_ts <= message.date.timestamp() < end_ts:
+                if message_ts < end_ts:
                     post = {
                         'text': message.text or "",
-                        'date': message.date.strftime('%d.%m.%Y %H:%M'),
+                        'date': format_datetime(message.date),
                         'views': message.views or 0,
                         'id': message.id,
                         'link': f"https://t.me/{channel_name}/{message.id}",
@@ -186,7 +448,9 @@ class TelegramAuth:
             self.auth_data['password'] = password
 
 class VKAPIError(Exception):
-    pass
+    def __init__(self, message, error_code=None):
+        super().__init__(message)
+        self.error_code = error_code
 
 class APIError(Exception):
     """Базовый класс ошибок API"""
@@ -200,11 +464,37 @@ class AuthError(Exception):
     """Ошибка аутентификации"""
     pass
 
+class RateLimiter:
+    """
+    Общий для всех потоков ограничитель частоты запросов к API
+    Пропускает не более limit запросов за любые period секунд: каждый запрос
+    занимает токен, который освобождается через period после отправки
+    """
+    def __init__(self, limit, period=1.0):
+        self.period = period
+        self.lock = threading.Lock()
+        # Моменты отправки последних limit запросов (уже выданные токены)
+        self.sent = collections.deque([float('-inf')] * limit, maxlen=limit)
+
+    def wait(self):
+        """Блокирует поток до момента, когда можно отправить следующий запрос"""
+        with self.lock:
+            now = time.monotonic()
+            send_at = max(now, self.sent[0] + self.period)
+            self.sent.append(send_at)
+        delay = send_at - now
+        if delay > 0:
+            time.sleep(delay)
+
 class VKParser(QMainWindow):
     update_progress = pyqtSignal(int)
     update_status = pyqtSignal(str)
     parsing_finished = pyqtSignal()
     telegram_auth_needed = pyqtSignal()
+    communities_loaded = pyqtSignal(list, str)
+    communities_load_failed = pyqtSignal(str)
+    telegram_auth_done = pyqtSignal(object)  # результат авторизации или исключение
+    open_folder_requested = pyqtSignal(str)
 
     def __init__(self):
         """Инициализация парсера"""
@@ -212,14 +502,46 @@ class VKParser(QMainWindow):
         self.setup_ui()
         self.setup_connections()
         
-        self.thread_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+        # Фоновые задачи интерфейса: загрузка файла сообществ, run_parsing и prepare_report,
+        # который ставит сам run_parsing; при двух потоках подготовка отчета может ждать загрузку файла.
+        # Запросы к VK распределяет собственный пул в run_parsing
+        self.thread_pool = ThreadPoolExecutor(max_workers=2)
+        # Общая сессия: соединения с api.vk.com переиспользуются между запросами и потоками
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=MAX_WORKERS,
+            pool_maxsize=MAX_WORKERS * 2,
+            # 429 и 5xx повторяются только здесь, на уровне соединения с учетом Retry-After;
+            # сетевые ошибки и ошибки VK API по-прежнему обрабатывает make_vk_request
+            max_retries=Retry(
+                total=None,
+                connect=0,
+                read=0,
+                other=0,
+                status=MAX_ATTEMPTS - 1,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset({'POST'}),
+                backoff_factor=REQUEST_DELAY,
+                respect_retry_after_header=True
+            )
+        ))
+        # Токен и версия API одинаковы для всех запросов
+        self.session.params = {'access_token': VK_TOKEN, 'v': VK_VERSION}
+        # Лимит VK действует на токен, то есть на все потоки вместе
+        self.rate_limiter = RateLimiter(VK_RATE_LIMIT)
         self.running = False
         self.stop_flag = False
         self.search_texts = []
+        self.search_automaton = None
         self.communities = []
         self.save_folder = os.path.join(os.getcwd(), "результаты_парсинга")
         
         self.telegram_parser = TelegramParser()
+        # Обработчики сообществ по префиксу платформы из Community.platform
+        self.community_handlers = {
+            'vk': self.search_vk_community,
+            'tg': self.search_telegram_community
+        }
         
         self.last_communities_file = None
         self.last_communities_hash = None
@@ -237,8 +559,8 @@ class VKParser(QMainWindow):
         config_path = os.path.join(os.getcwd(), "vk_parser_config.json")
         if os.path.exists(config_path):
             try:
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
+                with open(config_path, 'rb') as f:
+                    config = json_loads(f.read())
                     self.last_communities_file = config.get('last_communities_file')
                     self.last_communities_hash = config.get('last_communities_hash')
             except Exception as error:
@@ -252,6 +574,18 @@ class VKParser(QMainWindow):
         Вызывается после успешной загрузки файла с сообществами
         """
         config_path = os.path.join(os.getcwd(), "vk_parser_config.json")
+        
+        # Повторная загрузка того же файла не должна переписывать конфиг
+        if os.path.exists(config_path):
+            try:
+                with open(config_path, 'rb') as f:
+                    config = json_loads(f.read())
+                if (config.get('last_communities_file') == self.last_communities_file and
+                        config.get('last_communities_hash') == self.last_communities_hash):
+                    return
+            except Exception as e:
+                logging.error(f"Ошибка чтения конфига: {str(e)}")
+        
         try:
             with open(config_path, 'w', encoding='utf-8') as f:
                 json.dump({
@@ -271,44 +605,63 @@ class VKParser(QMainWindow):
         )
 
         if file_path:
-            try:
-                wb = openpyxl.load_workbook(file_path)
-                sheet = wb.active
-                self.communities = []
-                
-                for row in sheet.iter_rows(min_row=2, max_col=2, values_only=True):
-                    if not row or len(row) < 2:
-                        continue
-                    
-                    link = str(row[0]).strip() if row[0] else ""
-                    name = str(row[1]).strip() if row[1] else ""
-                    
-                    domain = self.extract_domain_from_link(link)
-                    if domain:
-                        self.communities.append({
-                            "original_link": link,
-                            "domain": domain,
-                            "name": name
-                        })
-                
-                self.update_status.emit(f"Загружено {len(self.communities)} сообществ")
-                
-                # Сохраняем информацию о загруженном файле и хэш списка
-                self.last_communities_file = file_path
-                self.last_communities_hash = self.calculate_communities_hash()
-                self.save_communities_config()
-                
-            except Exception as e:
-                QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить файл: {str(e)}")
-                logging.error(f"Ошибка загрузки файла: {str(e)}")
+            # Чтение файла и разбор ссылок идут в фоне, чтобы не блокировать интерфейс
+            self.update_status.emit("Загрузка списка сообществ...")
+            self.thread_pool.submit(self.read_communities_file, file_path)
+
+    def read_communities_file(self, file_path):
+        """
+        Читает файл с сообществами в фоновом потоке
+        Результат передается в поток интерфейса сигналом communities_loaded
+        """
+        try:
+            communities = []
+            for row in read_sheet_rows(file_path):
+                # В режиме read_only строка может быть короче двух колонок,
+                # если размеры листа в файле записаны неточно
+                if not row or not row[0]:
+                    continue
+
+                link = str(row[0]).strip()
+                name = str(row[1]).strip() if len(row) > 1 and row[1] else ""
+
+                domain = self.extract_domain_from_link(link)
+                if domain:
+                    communities.append(Community(link, domain, name, domain[:2], domain[3:]))
+
+            self.communities_loaded.emit(communities, file_path)
+
+        except Exception as e:
+            logging.error(f"Ошибка загрузки файла: {str(e)}")
+            self.communities_load_failed.emit(str(e))
+
+    def on_communities_loaded(self, communities, file_path):
+        self.communities = communities
+        self.update_status.emit(f"Загружено {len(self.communities)} сообществ")
+        
+        # Сохраняем информацию о загруженном файле и хэш списка
+        self.last_communities_file = file_path
+        self.last_communities_hash = self.calculate_communities_hash()
+        self.save_communities_config()
+
+    def on_communities_load_failed(self, error):
+        QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить файл: {error}")
 
     def calculate_communities_hash(self):
         """
-        Вычисляет MD5 хэш списка сообществ для сравнения
+        Вычисляет хэш (BLAKE2b, 16 байт) списка сообществ для сравнения
         Используется для определения, изменился ли список сообществ с прошлого раза
+        Поля подаются в хэш по очереди, без сборки общей JSON-строки
         """
-        communities_str = json.dumps(self.communities, sort_keys=True)
-        return hashlib.md5(communities_str.encode('utf-8')).hexdigest()
+        h = hashlib.blake2b(digest_size=16)
+        for community in self.communities:
+            h.update(community.domain.encode('utf-8'))
+            h.update(b'\x1f')
+            h.update(community.original_link.encode('utf-8'))
+            h.update(b'\x1f')
+            h.update(community.name.encode('utf-8'))
+            h.update(b'\x1e')
+        return h.hexdigest()
 
     def setup_ui(self):
         uic.loadUi("parse_main.ui", self)
@@ -328,39 +681,7 @@ class VKParser(QMainWindow):
         if not link:
             return None
 
-        link = str(link).strip().lower()
-        
-        # Обрабатываем vk.ru и vk.com как эквивалентные
-        link = link.replace('vk.com', 'vk.ru')
-        
-        vk_patterns = [
-            r'(?:https?://)?(?:www\.)?vk\.ru/([a-z0-9_\-\.]+)/?',
-            r'club(\d+)',
-            r'public(\d+)',
-            r'id(\d+)',
-            r'([a-z0-9_\-\.]+)$'
-        ]
-
-        tg_patterns = [
-            r'(?:https?://)?(?:www\.)?t(?:elegram)?\.me/([a-z0-9_\-]+)/?',
-            r'(?:https?://)?(?:www\.)?telegram\.org/([a-z0-9_\-]+)/?',
-            r'@([a-z0-9_\-]+)$'
-        ]
-        
-        # Проверяем Telegram
-        for pattern in tg_patterns:
-            match = re.search(pattern, link)
-            if match:
-                domain = match.group(1)
-                return f"tg_{domain}"
-
-        for pattern in vk_patterns:
-            match = re.search(pattern, link)
-            if match:
-                domain = match.group(1)
-                return f"vk_{domain}"
-                
-        return None
+        return extract_domain(str(link).strip().lower())
     
     def get_search_texts(self):
         text = self.textEdit.toPlainText().strip()
@@ -373,89 +694,176 @@ class VKParser(QMainWindow):
             (end_date, start_date + timedelta(days=1)) if start_date > end_date else (start_date, end_date)
         )
 
+    def backoff(self, attempt):
+        """
+        Пауза перед повтором запроса: растет экспоненциально с номером попытки
+        Случайная добавка разводит во времени повторы из разных потоков
+        """
+        time.sleep(REQUEST_DELAY * (BACKOFF_FACTOR ** (attempt + 1)) + random.uniform(0, REQUEST_DELAY))
+
     def make_vk_request(self, method, params):
         for attempt in range(MAX_ATTEMPTS):
             try:
-                time.sleep(REQUEST_DELAY * (BACKOFF_FACTOR ** attempt))
-                params.update({'access_token': VK_TOKEN, 'v': VK_VERSION})
-                response = requests.get(f'https://api.vk.com/method/{method}', params=params, timeout=10)
-                data = response.json()
+                self.rate_limiter.wait()
+                # POST: код execute для пачки сообществ не помещается в URL
+                response = self.session.post(VK_API_URL + method, data=params, timeout=10)
+                data = json_loads(response.content)
                 
                 if 'error' in data:
                     error = data['error']
                     if error['error_code'] == 6:  # Too many requests
-                        time.sleep(1 + attempt)
+                        # Токен лимитера на паузу не тратится, повтор возьмет новый
+                        self.backoff(attempt)
                         continue
-                    elif error['error_code'] in [5, 15, 18, 100]:
-                        raise VKAPIError(f"VK API error {error['error_code']}: {error['error_msg']}")
+                    # 13 (ошибка выполнения execute, в т.ч. слишком большой ответ) и 14 (капча)
+                    # повтор того же запроса не исправит
+                    elif error['error_code'] in [5, 13, 14, 15, 18, 100]:
+                        raise VKAPIError(
+                            f"VK API error {error['error_code']}: {error['error_msg']}", error['error_code']
+                        )
                     continue
                     
                 return data
             
-            except requests.exceptions.RequestException as e:
+            except requests.exceptions.RetryError as e:
+                # Адаптер уже исчерпал свои повторы 429/5xx, второй круг повторов здесь не нужен
+                raise VKAPIError(f"Сервер VK не отвечает: {str(e)}")
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # ValueError - ответ не JSON (ошибка разбора orjson/json)
                 logging.error(f"Сетевая ошибка: {str(e)}")
+                self.backoff(attempt)
                 continue
         
         raise VKAPIError(f"Не удалось выполнить запрос после {MAX_ATTEMPTS} попыток")
 
-    def get_group_posts(self, domain, start_date, end_date):
-        if not domain.startswith('vk_'):
-            logging.error(f"Некорректный домен для VK: {domain}")
-            return []
-        
-        vk_domain = domain[3:]
+    def batched_execute(self, method, calls_params):
+        """
+        Выполняет до EXECUTE_BATCH вызовов method одним запросом execute
+        Возвращает список items в порядке calls_params; None - вызов нужно повторить отдельно
+        """
+        if self.stop_flag:
+            return [None] * len(calls_params)
+        calls = [f"API.{method}({json.dumps(params)})" for params in calls_params]
+
+        try:
+            data = self.make_vk_request('execute', {'code': f"return [{','.join(calls)}];"})
+        except VKAPIError as e:
+            # Ответ на всю пачку не уложился в лимиты execute - пачка делится пополам
+            if e.error_code == 13 and len(calls_params) > 1:
+                middle = len(calls_params) // 2
+                return (self.batched_execute(method, calls_params[:middle]) +
+                        self.batched_execute(method, calls_params[middle:]))
+            logging.error(f"Ошибка пакетного запроса {method}: {str(e)}")
+            return [None] * len(calls_params)
+        except Exception as e:
+            logging.error(f"Ошибка пакетного запроса {method}: {str(e)}")
+            return [None] * len(calls_params)
+
+        if not data or 'response' not in data:
+            return [None] * len(calls_params)
+
+        for error in data.get('execute_errors', []):
+            logging.error(f"Ошибка VK API в execute: {error.get('method')} {error.get('error_code')}: {error.get('error_msg')}")
+
+        # Неудачный вложенный вызов возвращает false - такие вызовы повторяются по одному
+        return [response.get('items', []) if response else None for response in data['response']]
+
+    def batched_wall_get(self, domains):
+        """Первая страница стены сразу для нескольких сообществ одним вызовом execute"""
+        return self.batched_execute('wall.get', [{
+            'domain': domain,
+            'count': min(100, MAX_POSTS),
+            'offset': 0,
+            'filter': 'owner'
+        } for domain in domains])
+
+    def batched_get_comments(self, posts):
+        """
+        Первая страница комментариев к постам, по EXECUTE_BATCH постов на запрос execute
+        Возвращает список items в порядке posts
+        """
+        pages = []
+        for i in range(0, len(posts), EXECUTE_BATCH):
+            if self.stop_flag:
+                break
+            pages.extend(self.batched_execute('wall.getComments', [{
+                'owner_id': post['owner_id'],
+                'post_id': post['id'],
+                'count': 100,
+                'offset': 0,
+                'need_likes': 1,
+                'preview_length': 0
+            } for post in posts[i:i + EXECUTE_BATCH]]))
+        # После остановки оставшиеся посты получают None и не запрашиваются
+        pages.extend([None] * (len(posts) - len(pages)))
+        return pages
+
+    def get_group_posts(self, vk_domain, start_date, end_date, first_page=None):
         posts = []
         offset = 0
-        start_ts = int(time.mktime(start_date.timetuple()))
-        end_ts = int(time.mktime(end_date.timetuple()))
+        start_ts = date_to_timestamp(start_date)
+        end_ts = date_to_timestamp(end_date)
         
         while offset < MAX_POSTS and not self.stop_flag:
             try:
-                data = self.make_vk_request('wall.get', {
-                    'domain': vk_domain,  # Используем домен без префикса
-                    'count': min(100, MAX_POSTS - offset),
-                    'offset': offset,
-                    'filter': 'owner'
-                })
-                
-                if not data or 'response' not in data:
-                    break
-                    
-                items = data['response'].get('items', [])
+                if offset == 0 and first_page is not None:
+                    # Первая страница уже получена пакетным запросом execute
+                    items = first_page
+                else:
+                    data = self.make_vk_request('wall.get', {
+                        'domain': vk_domain,  # Используем домен без префикса
+                        'count': min(100, MAX_POSTS - offset),
+                        'offset': offset,
+                        'filter': 'owner'
+                    })
+
+                    if not data or 'response' not in data:
+                        break
+
+                    items = data['response'].get('items', [])
                 posts.extend(post for post in items if start_ts <= post['date'] < end_ts)
                 offset += len(items)
                 
                 if len(items) < 100:
                     break
+                
+                # Стена отдается от новых постов к старым: если на странице уже есть пост
+                # старше начала периода, следующие страницы не нужны (закрепленный не в счет)
+                if any(post['date'] < start_ts and not post.get('is_pinned') for post in items):
+                    break
                     
             except Exception as e:
-                logging.error(f"Ошибка при получении постов: {str(e)} {domain}")
+                logging.error(f"Ошибка при получении постов: {str(e)} {vk_domain}")
                 break
                 
         return posts
 
-    def get_post_comments(self, owner_id, post_id, start_date, end_date):
+    def get_post_comments(self, owner_id, post_id, start_date, end_date, first_page=None):
         """Получение комментариев к посту"""
         comments = []
         offset = 0
-        start_ts = int(time.mktime(start_date.timetuple()))
-        end_ts = int(time.mktime(end_date.timetuple()))
+        start_ts = date_to_timestamp(start_date)
+        end_ts = date_to_timestamp(end_date)
         
         while offset < 100 and not self.stop_flag:  # Ограничим количество комментариев
             try:
-                data = self.make_vk_request('wall.getComments', {
-                    'owner_id': owner_id,
-                    'post_id': post_id,
-                    'count': 100,
-                    'offset': offset,
-                    'need_likes': 1,
-                    'preview_length': 0
-                })
-                
-                if not data or 'response' not in data:
-                    break
+                if offset == 0 and first_page is not None:
+                    # Первая страница уже получена пакетным запросом execute
+                    items = first_page
+                else:
+                    data = self.make_vk_request('wall.getComments', {
+                        'owner_id': owner_id,
+                        'post_id': post_id,
+                        'count': 100,
+                        'offset': offset,
+                        'need_likes': 1,
+                        'preview_length': 0
+                    })
                     
-                items = data['response'].get('items', [])
+                    if not data or 'response' not in data:
+                        break
+                        
+                    items = data['response'].get('items', [])
                 for comment in items:
                     if start_ts <= comment['date'] < end_ts:
                         comment['type'] = 'комментарий'  # Добавляем тип контента
@@ -473,44 +881,57 @@ class VKParser(QMainWindow):
                 
         return comments
 
-    def search_text_in_content(self, content_items, search_texts, content_type='пост'):
+    def build_search_automaton(self, search_texts):
+        """
+        Строит автомат Ахо-Корасик по искомым словам
+        Все слова находятся за один проход по тексту, а не отдельным поиском каждого слова
+        Сравнение через casefold (ß = ss и т.п.), в отчет попадает слово в нижнем регистре
+        """
+        automaton = ahocorasick.Automaton()
+        for index, word in enumerate(search_texts):
+            automaton.add_word(word.casefold(), (index, word.lower()))
+        automaton.make_automaton()
+        return automaton
+
+    def search_text_in_content(self, content_items, automaton, content_type='пост'):
         """Поиск текста в контенте (постах или комментариях)"""
         results = []
-        search_texts = [t.lower() for t in search_texts]
         
         for item in content_items:
             if self.stop_flag:
                 break
                 
-            text = item.get('text', '').lower()
-            found_words = [word for word in search_texts if word in text]
+            text = item.get('text', '')
+            if not text:
+                # Репосты и посты только с вложениями искать не в чем
+                continue
+            
+            # Сортировка по индексу сохраняет порядок слов из запроса
+            found_words = [word for _, word in sorted({value for _, value in automaton.iter(text.casefold())})]
             
             if found_words:
                 if content_type == 'пост':
-                    result = {
-                        'type': 'пост',
-                        'post_id': item['id'],
-                        'owner_id': item['owner_id'],
-                        'text': item.get('text', ''),
-                        'date': datetime.fromtimestamp(item['date']).strftime('%d.%m.%Y %H:%M'),
-                        'views': item.get('views', {}).get('count', 0),
-                        'likes': item.get('likes', {}).get('count', 0),
-                        'reposts': item.get('reposts', {}).get('count', 0),
-                        'link': f"https://vk.com/wall{item['owner_id']}_{item['id']}",
-                        'found_words': ', '.join(found_words)
-                    }
+                    result = ResultRow(
+                        'пост',
+                        f"https://vk.com/wall{item['owner_id']}_{item['id']}",
+                        text,
+                        ', '.join(found_words),
+                        format_timestamp(item['date']),
+                        item.get('views', {}).get('count', 0),
+                        item.get('likes', {}).get('count', 0),
+                        item.get('reposts', {}).get('count', 0)
+                    )
                 else:  # комментарий
-                    result = {
-                        'type': 'комментарий',
-                        'post_id': item['post_id'],
-                        'owner_id': item['owner_id'],
-                        'comment_id': item['id'],
-                        'text': item.get('text', ''),
-                        'date': datetime.fromtimestamp(item['date']).strftime('%d.%m.%Y %H:%M'),
-                        'likes': item.get('likes', {}).get('count', 0),
-                        'link': f"https://vk.com/wall{item['owner_id']}_{item['post_id']}?reply={item['id']}",
-                        'found_words': ', '.join(found_words)
-                    }
+                    result = ResultRow(
+                        'комментарий',
+                        f"https://vk.com/wall{item['owner_id']}_{item['post_id']}?reply={item['id']}",
+                        text,
+                        ', '.join(found_words),
+                        format_timestamp(item['date']),
+                        0,
+                        item.get('likes', {}).get('count', 0),
+                        0
+                    )
                 
                 results.append(result)
                 
@@ -524,34 +945,24 @@ class VKParser(QMainWindow):
             logging.error(f"Ошибка аутентификации Telegram: {str(e)}")
             return False
 
-    def get_telegram_posts(self, domain, start_date, end_date):
+    def get_telegram_posts(self, channel_name, start_date, end_date):
         """Получение постов из Telegram канала"""
-        if not domain.startswith('tg_'):
-            logging.error(f"Некорректный домен для Telegram: {domain}")
-            return []
-            
-        channel_name = domain[3:]
-        
         if not self.telegram_parser.client:
             if not self.show_telegram_auth_dialog():
                 return []
         
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            posts = loop.run_until_complete(
+            return self.telegram_parser.run(
                 self.telegram_parser.get_channel_posts(channel_name, start_date, end_date)
             )
-            return posts
         except Exception as e:
             logging.error(f"Ошибка получения постов Telegram: {str(e)}")
             return []
-        finally:
-            loop.close()
 
     def show_telegram_auth_dialog(self):
         """Показывает диалог аутентификации Telegram"""
-        auth_dialog = uic.loadUi("telegram_auth.ui")
+        auth_dialog = ui_class("telegram_auth.ui")()
+        auth_dialog.setupUi(auth_dialog)
         auth_dialog.setWindowTitle("Авторизация в Telegram")
         
         def handle_submit():
@@ -570,38 +981,45 @@ class VKParser(QMainWindow):
                 'password': password
             }
             
-            # Пытаемся авторизоваться
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                auth_result = loop.run_until_complete(
-                    self.authenticate_telegram(phone, code, password)
-                )
-                
-                if auth_result:
-                    auth_dialog.accept()
-                else:
-                    # Показываем поле для кода, если требуется
-                    if not auth_dialog.codeEdit.isVisible():
-                        auth_dialog.codeLabel.setHidden(False)
-                        auth_dialog.codeEdit.setHidden(False)
-                        auth_dialog.phoneEdit.setEnabled(False)
-                        QMessageBox.information(auth_dialog, "Информация", "Введите код из Telegram")
-                    else:
-                        QMessageBox.warning(auth_dialog, "Ошибка", "Не удалось авторизоваться")
-            except SessionPasswordNeededError:
+            # Пытаемся авторизоваться: запрос идет в цикле Telegram, окно не блокируется,
+            # результат возвращается в поток интерфейса сигналом telegram_auth_done
+            auth_dialog.submitButton.setEnabled(False)
+            future = self.telegram_parser.submit(
+                self.authenticate_telegram(phone, code, password)
+            )
+            future.add_done_callback(
+                lambda f: self.telegram_auth_done.emit(f.exception() or f.result())
+            )
+        
+        def handle_result(auth_result):
+            auth_dialog.submitButton.setEnabled(True)
+            
+            if isinstance(auth_result, SessionPasswordNeededError):
                 auth_dialog.passwordLabel.setHidden(False)
                 auth_dialog.passwordEdit.setHidden(False)
                 QMessageBox.information(auth_dialog, "Информация", "Введите пароль 2FA")
-            except Exception as e:
-                QMessageBox.warning(auth_dialog, "Ошибка", f"Ошибка авторизации: {str(e)}")
-            finally:
-                loop.close()
+            elif isinstance(auth_result, Exception):
+                QMessageBox.warning(auth_dialog, "Ошибка", f"Ошибка авторизации: {str(auth_result)}")
+            elif auth_result:
+                auth_dialog.accept()
+            else:
+                # Показываем поле для кода, если требуется
+                if not auth_dialog.codeEdit.isVisible():
+                    auth_dialog.codeLabel.setHidden(False)
+                    auth_dialog.codeEdit.setHidden(False)
+                    auth_dialog.phoneEdit.setEnabled(False)
+                    QMessageBox.information(auth_dialog, "Информация", "Введите код из Telegram")
+                else:
+                    QMessageBox.warning(auth_dialog, "Ошибка", "Не удалось авторизоваться")
         
         auth_dialog.submitButton.clicked.connect(handle_submit)
         auth_dialog.cancelButton.clicked.connect(auth_dialog.reject)
+        self.telegram_auth_done.connect(handle_result)
         
-        return auth_dialog.exec_()
+        try:
+            return auth_dialog.exec_()
+        finally:
+            self.telegram_auth_done.disconnect(handle_result)
 
     def setup_connections(self):
         self.parseButton.clicked.connect(self.start_parsing)
@@ -612,60 +1030,153 @@ class VKParser(QMainWindow):
         self.update_status.connect(self.statusLabel.setText)
         self.parsing_finished.connect(self.on_parsing_finished)
         self.telegram_auth_needed.connect(self.show_telegram_auth_dialog)
+        self.communities_loaded.connect(self.on_communities_loaded)
+        self.communities_load_failed.connect(self.on_communities_load_failed)
+        self.open_folder_requested.connect(self.open_save_folder)
+
+    def search_vk_community(self, community, automaton, start_date, end_date, first_page=None):
+        """Поиск по постам и комментариям сообщества VK"""
+        # Получаем посты
+        posts = self.get_group_posts(community.bare, start_date, end_date, first_page)
+        post_results = self.search_text_in_content(posts, automaton, 'пост')
+        
+        # Получаем комментарии для каждого поста
+        # wall.get уже сообщает число комментариев: пустые посты не запрашиваем
+        commented = [post for post in posts if post.get('comments', {}).get('count', 1)]
+        comment_pages = self.batched_get_comments(commented)
+        
+        comment_results = []
+        for post, first_page in zip(commented, comment_pages):
+            if self.stop_flag:
+                break
+            comments = self.get_post_comments(post['owner_id'], post['id'], start_date, end_date, first_page)
+            comment_results.extend(self.search_text_in_content(comments, automaton, 'комментарий'))
+        
+        # Объединяем результаты
+        return post_results + comment_results
+
+    def search_telegram_community(self, community, automaton, start_date, end_date, first_page=None):
+        """Поиск по постам Telegram канала"""
+        posts = self.get_telegram_posts(community.bare, start_date, end_date)
+        return self.search_text_in_content(posts, automaton, 'пост')
 
-    def process_community(self, community, search_texts, start_date, end_date):
+    def process_community(self, community, automaton, start_date, end_date, first_page=None):
         if self.stop_flag:
             return None
+        # Обработчик выбирается по платформе сообщества
+        handler = self.community_handlers.get(community.platform)
+        if handler is None:
+            return None
         try:
-            if community['domain'].startswith('vk_'):
-                # Получаем посты
-                posts = self.get_group_posts(community['domain'], start_date, end_date)
-                post_results = self.search_text_in_content(posts, search_texts, 'пост')
-                
-                # Получаем комментарии для каждого поста
-                comment_results = []
-                for post in posts:
-                    comments = self.get_post_comments(post['owner_id'], post['id'], start_date, end_date)
-                    comment_results.extend(self.search_text_in_content(comments, search_texts, 'комментарий'))
-                
-                # Объединяем результаты
-                results = post_results + comment_results
-                return {'community': community, 'results': results} if results else None
-                
-            elif community['domain'].startswith('tg_'):
-                posts = self.get_telegram_posts(community['domain'], start_date, end_date)
-                results = self.search_text_in_content(posts, search_texts, 'пост')
-                return {'community': community, 'results': results} if results else None
-            else:
-                return None
+            results = handler(community, automaton, start_date, end_date, first_page)
+            return {'community': community, 'results': results} if results else None
             
         except Exception as e:
-            logging.error(f"Ошибка обработки сообщества {community['domain']}: {str(e)}")
+            logging.error(f"Ошибка обработки сообщества {community.domain}: {str(e)}")
             return None
 
-    def create_empty_communities_sheet(self, wb, empty_communities):
+    def process_community_batch(self, batch, automaton, start_date, end_date):
+        """
+        Обрабатывает пачку VK сообществ, первые страницы стен запрашиваются одним execute
+        Возвращает пары (сообщество, результат или None)
+        """
+        # После остановки пачки из очереди завершаются без запросов к API
+        if self.stop_flag:
+            return [(community, None) for community in batch]
+        first_pages = self.batched_wall_get([community.bare for community in batch])
+        return [
+            (community, self.process_community(community, automaton, start_date, end_date, first_page))
+            for community, first_page in zip(batch, first_pages)
+        ]
+
+    def create_empty_communities_sheet(self, wb, empty_communities, title="Не найдено"):
         if not empty_communities:
             return
             
-        ws = wb.create_sheet(title="Не найдено")
+        ws = wb.create_sheet(title=title)
         headers = ["Ссылка", "Название", "Причина"]
         
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=header)
-            cell.fill = HEADER_FILL
-            cell.font = HEADER_FONT
-            cell.alignment = HEADER_ALIGN
+        rows = []
+        widths = [len(header) for header in headers]
+        for comm in empty_communities:
+            values = [comm.original_link, comm.name, comm.reason]
+            rows.append(values)
+            
+            for i, value in enumerate(values):
+                length = len(str(value))
+                if length > widths[i]:
+                    widths[i] = length
         
-        for row_num, comm in enumerate(empty_communities, 2):
-            ws.cell(row=row_num, column=1, value=comm['original_link']).font = LINK_FONT
-            ws.cell(row=row_num, column=2, value=comm['name'])
-            ws.cell(row=row_num, column=3, value=comm.get('reason', 'Нет совпадений'))
+        for i, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(i)].width = (width + 2) * 1.2
         
-        for row in ws.iter_rows():
-            for cell in row:
-                cell.alignment = Alignment(wrap_text=True)
+        ws.append([styled_cell(ws, header, HEADER_STYLE) for header in headers])
+        for values in rows:
+            values[0] = styled_cell(ws, values[0], LINK_STYLE)
+            ws.append(values)
 
-    def create_report(self, data, empty_communities):
+    def copy_report_sheets(self, wb, filepath, skip_titles):
+        """
+        Переносит листы из существующего отчета в новую книгу write_only, кроме skip_titles
+        Старый файл читается потоково (read_only), книга целиком в память не загружается
+        """
+        src = openpyxl.load_workbook(filepath, read_only=True)
+        styles = {}
+        try:
+            for src_ws in src.worksheets:
+                # Остановленный парсинг отчет не сохраняет, копировать старые листы незачем
+                if self.stop_flag:
+                    break
+                if src_ws.title in skip_titles:
+                    continue
+                ws = wb.create_sheet(title=src_ws.title)
+                
+                # Ширина колонок в режиме read_only недоступна, поэтому считается
+                # заново по значениям тем же способом, что и при создании листа
+                rows = []
+                widths = []
+                for src_row in src_ws.iter_rows():
+                    values = []
+                    for i, cell in enumerate(src_row):
+                        length = len(str(cell.value)) if cell.value is not None else 0
+                        if i == len(widths):
+                            widths.append(length)
+                        elif length > widths[i]:
+                            widths[i] = length
+                        values.append(copied_cell(ws, cell, styles))
+                    rows.append(values)
+                
+                for i, width in enumerate(widths, 1):
+                    ws.column_dimensions[get_column_letter(i)].width = (width + 2) * 1.2
+                for values in rows:
+                    ws.append(values)
+        finally:
+            src.close()
+
+    def prepare_report(self):
+        """
+        Создает книгу отчета и переносит в нее листы прошлых запусков из существующего файла
+        Возвращает (книга, путь к файлу, дата листа); вызывается из create_report или заранее, параллельно с парсингом
+        """
+        current_date = datetime.now().strftime("%d.%m.%Y")
+        report_name = "результаты_парсинга.xlsx"
+        filepath = os.path.join(self.save_folder, report_name)
+        
+        same_communities = False
+        if os.path.exists(filepath) and self.last_communities_hash:
+            current_hash = self.calculate_communities_hash()
+            if current_hash == self.last_communities_hash:
+                same_communities = True
+        
+        # Файл всегда пишется заново и потоково: строки сразу уходят в XML, объекты Cell не хранятся
+        wb = Workbook(write_only=True)
+        add_report_styles(wb)
+        if same_communities and os.path.exists(filepath):
+            # Листы прошлых запусков переносятся из старого файла, листы за сегодня пишутся заново
+            self.copy_report_sheets(wb, filepath, {current_date, f"Не найдено ({current_date})"})
+        return wb, filepath, current_date
+
+    def create_report(self, data, empty_communities, report_future=None):
         """
         функция создания отчета
         сохраняет все результаты в один файл с разными листами
@@ -675,31 +1186,20 @@ class VKParser(QMainWindow):
         - Для текущей даты создает/перезаписывает лист с результатами
         - Для пустых сообществ создает лист с датой в названии
         3. Если список сообществ изменился - создает новый файл
+        report_future - результат prepare_report, запущенного заранее (если None, книга готовится здесь)
         P.S. странно немного но окэ
         """
         if not data and not empty_communities:
             return None
             
         try:
-            current_date = datetime.now().strftime("%d.%m.%Y")
-            report_name = "результаты_парсинга.xlsx"
-            filepath = os.path.join(self.save_folder, report_name)
-            
-            same_communities = False
-            if os.path.exists(filepath) and self.last_communities_hash:
-                current_hash = self.calculate_communities_hash()
-                if current_hash == self.last_communities_hash:
-                    same_communities = True
-            
-            if same_communities and os.path.exists(filepath):
-                wb = openpyxl.load_workbook(filepath)
-                if current_date in wb.sheetnames:
-                    del wb[current_date]
-                ws = wb.create_sheet(title=current_date)
+            if report_future is not None:
+                wb, filepath, current_date = report_future.result()
             else:
-                wb = Workbook()
-                ws = wb.active
-                ws.title = current_date
+                wb, filepath, current_date = self.prepare_report()
+            empty_sheet_name = f"Не найдено ({current_date})"
+            
+            ws = wb.create_sheet(title=current_date)
             
             if data:
                 headers = [
@@ -707,74 +1207,37 @@ class VKParser(QMainWindow):
                     'Текст', 'Найденные слова', 'Дата', 'Просмотры', 'Лайки', 'Репосты'
                 ]
                 
-                for col_num, header in enumerate(headers, 1):
-                    cell = ws.cell(row=1, column=col_num, value=header)
-                    cell.fill = HEADER_FILL
-                    cell.font = HEADER_FONT
-                    cell.alignment = HEADER_ALIGN
-                
-                row_num = 2
+                rows = []
+                widths = [len(header) for header in headers]
                 for item in data:
                     comm = item['community']
                     for res in item['results']:
-                        ws.cell(row=row_num, column=1, value=res.get('type', 'пост'))
-                        ws.cell(row=row_num, column=2, value=comm['original_link']).font = LINK_FONT
-                        ws.cell(row=row_num, column=3, value=comm['name'])
-                        ws.cell(row=row_num, column=4, value=res['link']).font = LINK_FONT
-                        text_cell = ws.cell(row=row_num, column=5, value=res['text'])
-                        text_cell.alignment = Alignment(wrap_text=True)
-                        ws.cell(row=row_num, column=6, value=res['found_words'])
-                        ws.cell(row=row_num, column=7, value=res['date'])
-                        ws.cell(row=row_num, column=8, value=res.get('views', 0))
-                        ws.cell(row=row_num, column=9, value=res.get('likes', 0))
-                        ws.cell(row=row_num, column=10, value=res.get('reposts', 0))
-                        row_num += 1
-                
-                for column in ws.columns:
-                    max_length = 0
-                    column_letter = get_column_letter(column[0].column)
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = (max_length + 2) * 1.2
-                    ws.column_dimensions[column_letter].width = adjusted_width
-            
-            empty_sheet_name = f"Не найдено ({current_date})"
-            if empty_sheet_name in wb.sheetnames:
-                del wb[empty_sheet_name]
-                
-            if empty_communities:
-                ws_empty = wb.create_sheet(title=empty_sheet_name)
-                headers = ["Ссылка", "Название", "Причина"]
-                
-                for col_num, header in enumerate(headers, 1):
-                    cell = ws_empty.cell(row=1, column=col_num, value=header)
-                    cell.fill = HEADER_FILL
-                    cell.font = HEADER_FONT
-                    cell.alignment = HEADER_ALIGN
+                        values = [res.type, comm.original_link, comm.name, *res[1:]]
+                        rows.append(values)
+                        
+                        for i, value in enumerate(values):
+                            length = len(str(value))
+                            if length > widths[i]:
+                                widths[i] = length
                 
-                for row_num, comm in enumerate(empty_communities, 2):
-                    ws_empty.cell(row=row_num, column=1, value=comm['original_link']).font = LINK_FONT
-                    ws_empty.cell(row=row_num, column=2, value=comm['name'])
-                    ws_empty.cell(row=row_num, column=3, value=comm.get('reason', 'Нет совпадений'))
+                # В режиме write_only ширину колонок нужно задать до первой строки
+                for i, width in enumerate(widths, 1):
+                    ws.column_dimensions[get_column_letter(i)].width = (width + 2) * 1.2
                 
-
-                for column in ws_empty.columns:
-                    max_length = 0
-                    column_letter = get_column_letter(column[0].column)
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = (max_length + 2) * 1.2
-                    ws_empty.column_dimensions[column_letter].width = adjusted_width
+                ws.append([styled_cell(ws, header, HEADER_STYLE) for header in headers])
+                for values in rows:
+                    values[1] = styled_cell(ws, values[1], LINK_STYLE)
+                    values[3] = styled_cell(ws, values[3], LINK_STYLE)
+                    values[4] = styled_cell(ws, values[4], WRAP_STYLE)
+                    ws.append(values)
+            
+            self.create_empty_communities_sheet(wb, empty_communities, empty_sheet_name)
             
-            wb.save(filepath)
+            # Сначала пишется временный файл, затем он заменяет отчет: при ошибке записи
+            # старый отчет остается целым, а .tmp остается рядом для проверки
+            tmp_path = filepath + '.tmp'
+            wb.save(tmp_path)
+            os.replace(tmp_path, filepath)
             return filepath
             
         except Exception as e:
@@ -789,6 +1252,7 @@ class VKParser(QMainWindow):
         if not self.search_texts:
             QMessageBox.warning(self, "Ошибка", "Введите текст для поиска")
             return
+        self.search_automaton = self.build_search_automaton(self.search_texts)
             
         if not self.communities:
             QMessageBox.warning(self, "Ошибка", "Загрузите список сообществ")
@@ -806,48 +1270,58 @@ class VKParser(QMainWindow):
 
     def run_parsing(self, start_date, end_date):
         try:
-            vk_communities = [comm for comm in self.communities if comm['domain'].startswith('vk_')]
+            vk_communities = [comm for comm in self.communities if comm.platform == 'vk']
             total = len(vk_communities)
             results = []
             empty_communities = []
             
+            # Пачки поменьше, если сообществ мало, чтобы загрузить все потоки
+            batch_size = max(1, min(EXECUTE_BATCH, -(-total // MAX_WORKERS)))
+            # Прогресс отправляется в интерфейс примерно 200 раз за запуск, а не после каждого сообщества
+            progress_step = max(1, total // 200)
+            
+            # Перенос листов из старого отчета не зависит от результатов и идет параллельно с запросами к API
+            report_future = self.thread_pool.submit(self.prepare_report)
+            
             with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                futures = {
+                # Сообщество возвращается вместе с результатом, словарь future -> пачка не нужен
+                futures = [
                     executor.submit(
-                        self.process_community,
-                        comm,
-                        self.search_texts,
+                        self.process_community_batch,
+                        vk_communities[i:i + batch_size],
+                        self.search_automaton,
                         start_date,
                         end_date
-                    ): comm for comm in vk_communities
-                }
+                    ) for i in range(0, total, batch_size)
+                ]
                 
-                for i, future in enumerate(as_completed(futures), 1):
+                i = 0
+                for future in as_completed(futures):
                     if self.stop_flag:
                         break
                         
-                    result = future.result()
-                    if result:
-                        results.append(result)
-                    else:
-                        empty_communities.append({
-                            'original_link': futures[future]['original_link'],
-                            'name': futures[future]['name'],
-                            'reason': 'Нет совпадений'
-                        })
-                    
-                    progress = int((i / total) * 100)
-                    self.update_progress.emit(progress)
-                    self.update_status.emit(
-                        f"Обработано {i}/{total}. Найдено: {len(results)}, Пустых: {len(empty_communities)}"
-                    )
+                    for comm, result in future.result():
+                        i += 1
+                        if result:
+                            results.append(result)
+                        else:
+                            empty_communities.append(EmptyComm(comm.original_link, comm.name, 'Нет совпадений'))
+                        
+                        if i % progress_step == 0 or i == total:
+                            progress = int((i / total) * 100)
+                            self.update_progress.emit(progress)
+                            self.update_status.emit(
+                                f"Обработано {i}/{total}. Найдено: {len(results)}, Пустых: {len(empty_communities)}"
+                            )
             
             if not self.stop_flag:
-                report_path = self.create_report(results, empty_communities)
+                report_path = self.create_report(results, empty_communities, report_future)
                 if report_path:
                     self.update_status.emit(f"Отчет сохранен: {report_path}")
-                    if sys.platform == "win32":
-                        os.startfile(self.save_folder)
+                    self.open_folder_requested.emit(os.path.dirname(report_path))
+            else:
+                # Если подготовка отчета еще не началась, она не запустится
+                report_future.cancel()
             
         except Exception as e:
             self.update_status.emit(f"Ошибка: {str(e)}")
@@ -855,6 +1329,12 @@ class VKParser(QMainWindow):
         finally:
             self.parsing_finished.emit()
 
+    def open_save_folder(self, folder):
+        """Открывает папку с отчетом в проводнике, если это включено в интерфейсе"""
+        # Вызывается в потоке интерфейса: os.startfile из рабочего потока мог подвисать
+        if self.openFolderCheckBox.isChecked() and sys.platform == "win32":
+            os.startfile(folder)
+
     def on_parsing_finished(self):
         self.running = False
         self.parseButton.setEnabled(True)
@@ -892,6 +1372,7 @@ if __name__ == "__main__":
     
     app = QApplication(sys.argv)
     main_window = VKParser()
+    app.aboutToQuit.connect(main_window.telegram_parser.close)
     
     # Загрузка конфига если указан
     if args.config:
@@ -899,22 +1380,16 @@ if __name__ == "__main__":
     
     # Авторизация Telegram если есть данные
     if args.tg_phone:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            main_window.telegram_auth.set_auth_data(
-                phone=args.tg_phone,
-                code=args.tg_code,
-                password=args.tg_password
-            )
-            auth_result = loop.run_until_complete(
-                main_window.telegram_auth.authenticate()
-            )
-            if not auth_result:
-                logging.error("Telegram authentication failed")
-        finally:
-            loop.close()
+        main_window.telegram_auth.set_auth_data(
+            phone=args.tg_phone,
+            code=args.tg_code,
+            password=args.tg_password
+        )
+        auth_result = main_window.telegram_parser.run(
+            main_window.telegram_auth.authenticate()
+        )
+        if not auth_result:
+            logging.error("Telegram authentication failed")
     
     main_window.show()
     sys.exit(app.exec_())